@@ -1,125 +1,584 @@
 import os
+import argparse
 import time
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
-import httpx
-from openai import OpenAI
-import random
+import hashlib
+import html
+import threading
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Tuple
 import re
-from duckduckgo_search import DDGS
+import textwrap
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('prompt_agent')
+# Shared log format, applied by the entry points rather than at import time
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Relevance keywords for search results, matched in a single regex pass. Word
+# boundaries keep "tee" from matching inside words such as "teeth" or "steel".
+_TREND_KEYWORDS_RE = re.compile(
+    r'\b(?:t[- ]?shirts?|tees?|shirts?|design\w*|graphic\w*|print\w*|trend\w*|viral)\b',
+    re.IGNORECASE
+)
+# A numbered prompt line such as "1. ..." or "2) ...". Multiline, so finditer()
+# pulls every numbered line out of a whole response in one pass.
+_PROMPT_RE = re.compile(r'^[ \t]*\d+[.)][ \t]*(.+)$', re.MULTILINE)
+# Fixed instructions for prompt generation. Kept constant and sent as the system
+# message so providers can reuse a cached prefix across calls.
+PROMPT_ENGINEER_RULES = """You write prompts for AI image generators for commercially viable t-shirt designs, based on trend analysis of recent t-shirt images.
+- Write 5 unique, detailed prompts inspired by the analysis, ready for a text-to-image API like DALL-E 3.
+- Include style (e.g. minimalist vector, vintage screen-print), color palette, composition, and background (isolated on white is standard).
+- Optimize for printing: clean lines, scalable details, clear subject.
+- Output only a numbered list of 5 prompts, no explanations.
+Example: Minimalist single-line art of a cat, sleek and modern, black ink on a white background, vector style, high detail, commercial use ready."""
+# High-quality prompts used when AI prompt generation is unavailable
+_FALLBACK_PROMPTS = (
+    "Minimalist geometric wolf head, clean vector lines, black and gold color scheme, isolated on a white background, commercial printing ready.",
+    "Vintage-style sunset over a mountain range, distressed texture, retro color palette (orange, yellow, brown), detailed illustration, for screen printing.",
+    "Abstract cyberpunk brain with glowing neon circuits, futuristic and detailed, on a black t-shirt background, vibrant colors (pink, blue, purple).",
+    "Hand-drawn botanical illustration of a monstera leaf, detailed line work, sage green and white, minimalist and elegant, vector art.",
+    "Bold typography design with the word 'CREATE', letters breaking apart into geometric shapes, inspirational and modern, black and white with a single accent color.",
+)
+# On-disk cache of trend search results, shared between runs
+TREND_CACHE_PATH = os.getenv('TREND_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.trend_cache.json'))
+# On-disk cache of generated prompts, keyed by the set of trends they came from
+PROMPT_CACHE_PATH = os.getenv('PROMPT_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.prompt_cache.json'))
+# On-disk cache of multimodal image analyses, keyed by image URL
+ANALYSIS_CACHE_PATH = os.getenv('ANALYSIS_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.analysis_cache.json'))
+# Characters removed from environment variable values (quotes and spaces)
+_ENV_VAR_STRIP_TABLE = str.maketrans('', '', '"\' ')
+
+def _is_retryable_api_error(exc: BaseException) -> bool:
+    """Timeouts, connection errors, rate limits and 5xx responses are transient; other API errors are not."""
+    import openai
+
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    return isinstance(exc, openai.APIStatusError) and (exc.status_code == 429 or exc.status_code >= 500)
+
+# Jittered exponential backoff for OpenRouter retries, and the longest Retry-After we will honor
+_API_BACKOFF = wait_random_exponential(multiplier=2, max=20)
+_MAX_RETRY_AFTER = 60.0
+
+def _wait_for_api_retry(retry_state) -> float:
+    """Wait as long as a 429/503 Retry-After header asks, otherwise back off exponentially with jitter."""
+    response = getattr(retry_state.outcome.exception(), 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), _MAX_RETRY_AFTER)
+        except ValueError:
+            pass  # HTTP-date form; fall back to our own backoff
+    return _API_BACKOFF(retry_state)
+
+def _is_retryable_search_error(exc: BaseException) -> bool:
+    """DuckDuckGo rate limits and timeouts are transient; other search errors are not worth retrying."""
+    from duckduckgo_search.exceptions import RatelimitException, TimeoutException
+
+    return isinstance(exc, (RatelimitException, TimeoutException))
+
+class QueryCache:
+    """Thread-safe cache whose entries expire after a TTL (in seconds).
+
+    When a `path` is given, entries are also persisted to that JSON file so
+    they survive between runs of the agent. Values must be JSON-serializable.
+    """
+
+    def __init__(self, default_ttl: float = 1800, path: Optional[str] = None):
+        self.default_ttl = default_ttl
+        self.path = path
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.RLock()
+        # Lookup counters, reported at the end of each cycle
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            self._load()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Build a compact cache key from the given parts."""
+        return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value for `ttl` seconds (defaults to the cache's TTL)."""
+        with self._lock:
+            self._entries[key] = (time.time() + (ttl or self.default_ttl), value)
+            if self.path:
+                self._save()
+
+    def clear(self):
+        """Drop every entry, including any persisted to the cache file."""
+        with self._lock:
+            self._entries.clear()
+            if self.path:
+                self._save()
+
+    def _load(self):
+        """Load unexpired entries from the cache file, ignoring a missing or corrupt file."""
+        now = time.time()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                stored = json.load(f)
+            self._entries = {key: (expires_at, value) for key, (expires_at, value) in stored.items() if expires_at > now}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            # Valid JSON of the wrong shape counts as corrupt too; start with an empty cache
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("⚠️ Ignoring unreadable cache file %s: %s", self.path, e)
+            self._entries = {}
+
+    def _save(self):
+        """Atomically write all entries to the cache file."""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("⚠️ Could not write cache file %s: %s", self.path, e)
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `max_rate` calls per `time_period` seconds.
+
+    Calls only wait once the budget is used up, so bursts within the limit
+    go through immediately.
+    """
+
+    def __init__(self, max_rate: int, time_period: float):
+        self.capacity = max_rate
+        self.fill_rate = max_rate / time_period
+        self._tokens = float(max_rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.fill_rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.fill_rate
+            time.sleep(wait)
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker that fails fast while an upstream is down.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    raise CircuitOpenError for `recovery_timeout` seconds. After that a single
+    trial call is let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def call(self, func, *args, is_failure=lambda exc: True, **kwargs):
+        """Call `func` through the breaker. Only exceptions matching `is_failure` count against the upstream."""
+        self._check()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_failure(e):
+                self._record_failure()
+            else:
+                self._record_success()
+            raise
+        self._record_success()
+        return result
+
+    def _check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.recovery_timeout:
+                raise CircuitOpenError(f"{self.name} circuit is open after repeated failures")
+            self._trial_in_flight = True
+
+    def _record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("✅ %s recovered, closing circuit", self.name)
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning("🔌 %s failing, opening circuit for %ds", self.name, self.recovery_timeout)
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
 
 class PromptGeneratorAgent:
+    # Trend research queries; "{date}" is replaced with the current month and year
+    TREND_QUERIES = (
+        "trending t-shirt designs {date}",
+        "best selling graphic tees on etsy",
+        "pinterest popular t-shirt aesthetics",
+        "top instagram t-shirt trends",
+    )
+    # Size of the shared worker pool used for concurrent searches and image analyses
+    MAX_WORKERS = 5
+    # Number of trend images sent to the multimodal AI in a single request
+    ANALYSIS_BATCH_SIZE = 4
+    # Environment variables the agent cannot run without
+    REQUIRED_ENV_VARS = ('TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_ID', 'OPENROUTER_API_KEY')
+
     def __init__(self):
         """Initialize the agent with proper API configuration"""
-        self.telegram_token = self._clean_env_var(os.getenv('TELEGRAM_BOT_TOKEN'))
-        self.chat_id = self._clean_env_var(os.getenv('TELEGRAM_CHAT_ID'))
-        self.openrouter_key = self._clean_env_var(os.getenv('OPENROUTER_API_KEY'))
+        # Read and clean each variable once
+        env = {name: self._clean_env_var(os.getenv(name)) for name in self.REQUIRED_ENV_VARS}
 
         # Validate required configuration
-        if not all([self.telegram_token, self.chat_id, self.openrouter_key]):
-            logger.error("❌ Missing required environment variables")
-            raise ValueError("Missing environment variables: TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, and OPENROUTER_API_KEY must be set.")
-
-        # Configure OpenRouter API
+        missing = [name for name, value in env.items() if not value]
+        if missing:
+            logger.error("❌ Missing required environment variables: %s", ", ".join(missing))
+            raise ValueError(f"Missing environment variables: {', '.join(missing)} must be set.")
+
+        self.telegram_token = env['TELEGRAM_BOT_TOKEN']
+        self.chat_id = env['TELEGRAM_CHAT_ID']
+        self.openrouter_key = env['OPENROUTER_API_KEY']
+        self._telegram_url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
+
+        # Imported here so a misconfigured run fails fast without loading httpx or the SDK
+        import httpx
+        from openai import OpenAI
+
+        # Configure OpenRouter API. Keep idle connections alive between cycles and
+        # multiplex the concurrent image analyses over HTTP/2.
+        self.http_client = httpx.Client(
+            # Fail fast on connect and pool waits; leave reads long enough for slow completions
+            timeout=httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=5.0),
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+        )
         try:
             self.client = OpenAI(
                 base_url="https://openrouter.ai/api/v1",
                 api_key=self.openrouter_key,
-                http_client=httpx.Client(timeout=60.0, follow_redirects=True)
+                http_client=self.http_client,
+                max_retries=0  # Retries are handled by _create_completion
             )
             logger.info("✅ OpenRouter API configured successfully")
         except Exception as e:
-            logger.error(f"❌ Failed to configure OpenRouter API: {str(e)}")
+            logger.error("❌ Failed to configure OpenRouter API: %s", e)
+            self.http_client.close()
             raise
 
+        # Trend searches change slowly, so results are kept on disk for a day and shared
+        # between runs. An image's analysis doesn't change, so analyses are cached per
+        # image URL and only new images cost a multimodal call. Prompts are keyed by a
+        # hash of the trend set, so a cycle that finds the same trends as an earlier one
+        # skips the LLM call too.
+        self.search_cache = QueryCache(default_ttl=86400, path=TREND_CACHE_PATH)
+        self.analysis_cache = QueryCache(default_ttl=7 * 86400, path=ANALYSIS_CACHE_PATH)
+        self.prompt_cache = QueryCache(default_ttl=7 * 86400, path=PROMPT_CACHE_PATH)
+
+        # Stay under DuckDuckGo's rate limits without sleeping between every query
+        self.search_limiter = RateLimiter(max_rate=4, time_period=10)
+        # Stop waiting on retries and timeouts while an upstream is down; callers fall back instead.
+        # The breakers belong to this agent, so they only span cycles in a long-lived process
+        # such as the web app; each cron run starts with closed circuits.
+        self.search_breaker = CircuitBreaker("DuckDuckGo", failure_threshold=3, recovery_timeout=300)
+        self.openrouter_breaker = CircuitBreaker("OpenRouter", failure_threshold=5, recovery_timeout=300)
+
+        # Shared worker pool for blocking network calls (searches, AI requests)
+        self._pool = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix='agent')
+
+        # Reuse keep-alive connections for Telegram instead of a new TLS handshake per request.
+        # sendMessage is not idempotent, so only retry when the message cannot have been
+        # accepted: connection failures and 429 rate limits. Read errors and 5xx replies may
+        # come after Telegram delivered the message, so those are never retried.
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            other=0,
+            status=3,
+            backoff_factor=0.5,
+            status_forcelist=(429,),
+            allowed_methods=frozenset(['GET', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+
         logger.info("✅ Prompt Generator Agent initialized with full capabilities")
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Shut down the worker pool and release pooled network connections."""
+        self._pool.shutdown(wait=True)
+        self.session.close()
+        self.http_client.close()
+
+    def clear_caches(self):
+        """Forget cached searches, analyses and prompts so the next cycle starts from fresh research."""
+        self.search_cache.clear()
+        self.analysis_cache.clear()
+        self.prompt_cache.clear()
+        logger.info("🧹 Search, analysis and prompt caches cleared")
+
+    @retry(
+        retry=retry_if_exception(_is_retryable_api_error),
+        wait=_wait_for_api_retry,
+        stop=stop_after_attempt(3),
+        reraise=True
+    )
+    def _create_completion(self, **kwargs):
+        """Create a chat completion, retrying transient OpenRouter failures with jittered exponential backoff.
+
+        Every attempt goes through the OpenRouter circuit breaker, so failed retries count
+        towards opening it, and an open circuit stops the retries at once.
+        """
+        return self.openrouter_breaker.call(self.client.chat.completions.create, is_failure=_is_retryable_api_error, **kwargs)
+
     def _clean_env_var(self, value: str) -> str:
         """Clean environment variables by removing whitespace and special characters"""
         if not value:
             return None
-        return value.strip().replace('"', '').replace("'", '').replace(' ', '')
+        return value.strip().translate(_ENV_VAR_STRIP_TABLE)
+
+    def research_and_analyze_trends(self) -> List[Dict[str, Any]]:
+        """Research trends and analyze their images as a pipeline.
+
+        Each query's images are sent for analysis as soon as its search returns,
+        so the AI analysis overlaps with the searches that are still running.
+        Returns the analyzed trends in query order.
+        """
+        logger.info("🔍 Starting pipelined trend research and image analysis...")
+        search_queries = self._build_search_queries()
+        search_futures = {self._pool.submit(self._search_trend_images, query): query for query in search_queries}
+        analysis_futures = {query: [] for query in search_queries}
+
+        for future in as_completed(search_futures):
+            query = search_futures[future]
+            try:
+                trends = self._filter_relevant_trends(future.result())
+            except Exception as e:
+                logger.warning("⚠️ Search failed for '%s': %s", query, e)
+                continue
+
+            logger.info("🖼️ Analyzing %d trend images for '%s'...", len(trends), query)
+            analysis_futures[query] = [
+                self._pool.submit(self._analyze_trend_batch, batch) for batch in self._batch_trends(trends)
+            ]
+
+        analyzed_trends = [
+            trend
+            for query in search_queries
+            for future in analysis_futures[query]
+            for trend in future.result()
+            if trend is not None
+        ]
+        logger.info("✅ Research and analysis complete. %d images successfully analyzed.", len(analyzed_trends))
+        return analyzed_trends
 
-    def conduct_trend_research(self) -> List[Dict[str, Any]]:
-        """Research current t-shirt design trends using keyless search"""
-        logger.info("🔍 Starting keyless trend research...")
-        trends = []
+    def _build_search_queries(self) -> List[str]:
+        """Fill the current month and year into the trend query table."""
+        current_date = datetime.now().strftime("%B %Y")
+        return [query.format(date=current_date) for query in self.TREND_QUERIES]
+
+    def _search_trend_images(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """Run a single image search. Each call uses its own DDGS session so it is safe to run in a worker thread."""
+        cache_key = QueryCache.make_key(query, max_results, date.today().isoformat())
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            logger.info("♻️ Using cached results for: '%s'", query)
+            return list(cached)
+
+        logger.info("🌐 Searching for: '%s'", query)
+        results = self._fetch_image_results(query, max_results)
+
+        trends = [
+            {
+                "title": result.get("title", "Untitled"),
+                "source": result.get("url", "Unknown"),
+                "image_url": result.get("image", ""),
+                "query": query
+            } for result in results
+        ]
+        # An empty result is usually DuckDuckGo soft-throttling; don't pin it for the rest of the day
+        if trends:
+            self.search_cache.set(cache_key, trends)
+        return list(trends)
+
+    @retry(
+        retry=retry_if_exception(_is_retryable_search_error),
+        # Full jitter: wait anywhere in [0, min(8, 0.5 * 2**attempt)] so concurrent searches don't retry in lockstep
+        wait=wait_random_exponential(multiplier=0.5, max=8),
+        stop=stop_after_attempt(2),
+        before_sleep=lambda state: logger.warning(
+            "⏳ Search failed (%s), retry %d", type(state.outcome.exception()).__name__, state.attempt_number
+        ),
+        reraise=True
+    )
+    def _fetch_image_results(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Fetch raw image results from DuckDuckGo, backing off with jitter on rate limits and timeouts.
+
+        Each attempt goes through the search circuit breaker before it takes a rate-limiter token.
+        """
+        return self.search_breaker.call(self._run_image_search, query, max_results, is_failure=_is_retryable_search_error)
+
+    def _run_image_search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Make a single rate-limited DuckDuckGo image search."""
+        from duckduckgo_search import DDGS
+
+        self.search_limiter.acquire()
+        with DDGS() as ddgs:
+            return list(ddgs.images(query, max_results=max_results))
+
+    def _filter_relevant_trends(self, trends: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop results that cannot be analyzed or are clearly off-topic, so they never reach the multimodal AI"""
+        with_images = [trend for trend in trends if trend["image_url"]]
+        relevant = [trend for trend in with_images if _TREND_KEYWORDS_RE.search(trend["title"])]
+
+        # Image titles are noisy; keep everything rather than returning nothing
+        if not relevant:
+            return with_images
+
+        if len(relevant) < len(trends):
+            logger.info("🧹 Skipping %d off-topic or image-less results.", len(trends) - len(relevant))
+        return relevant
+
+    def _batch_trends(self, trends: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Split trends into groups of ANALYSIS_BATCH_SIZE for batched analysis."""
+        batch_size = self.ANALYSIS_BATCH_SIZE
+        return [trends[i:i + batch_size] for i in range(0, len(trends), batch_size)]
+
+    def _analyze_trend_batch(self, batch: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Analyze a batch of trend images, reusing cached analyses and only sending new images to the AI."""
+        cached = [self.analysis_cache.get(QueryCache.make_key(trend["image_url"])) for trend in batch]
+        pending = [trend for trend, analysis in zip(batch, cached) if analysis is None]
+        if len(pending) < len(batch):
+            logger.info("♻️ Reusing %d cached image analyses.", len(batch) - len(pending))
+
+        fresh = iter(self._request_batch_analysis(pending) if pending else ())
+        results = []
+        for trend, analysis in zip(batch, cached):
+            if analysis is not None:
+                results.append({**trend, "analysis": analysis})
+                continue
+            result = next(fresh)
+            if result is not None:
+                self.analysis_cache.set(QueryCache.make_key(trend["image_url"]), result["analysis"])
+            results.append(result)
+        return results
+
+    def _request_batch_analysis(self, batch: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Analyze several trend images in one request, falling back to one request per image if the reply can't be matched up."""
+        if len(batch) == 1:
+            return [self._analyze_trend_image(batch[0])]
 
         try:
-            current_date = datetime.now().strftime("%B %Y")
-            search_queries = [
-                f"trending t-shirt designs {current_date}",
-                "best selling graphic tees on etsy",
-                "pinterest popular t-shirt aesthetics",
-                "top instagram t-shirt trends"
+            content = [
+                {
+                    "type": "text",
+                    "text": f"Analyze each of these {len(batch)} t-shirt design images, in order. For each image, describe the main subject, style (e.g., minimalist, vintage, abstract), color palette, and overall mood as a concise, one-sentence summary of the design concept. Reply with a numbered list of exactly {len(batch)} lines, one per image, and nothing else."
+                }
             ]
+            content.extend({"type": "image_url", "image_url": {"url": trend["image_url"]}} for trend in batch)
 
-            with DDGS() as ddgs:
-                for query in search_queries:
-                    logger.info(f"🌐 Searching for: '{query}'")
-                    results = list(ddgs.images(query, max_results=5))
+            response = self._create_completion(
+                model="google/gemini-flash-1.5",
+                messages=[{"role": "user", "content": content}],
+                max_tokens=200 * len(batch)
+            )
 
-                    for result in results:
-                        trends.append({
-                            "title": result.get("title", "Untitled"),
-                            "source": result.get("url", "Unknown"),
-                            "image_url": result.get("image", ""),
-                            "query": query
-                        })
+            if response.choices:
+                raw_content = response.choices[0].message.content or ""
+                analyses = [match.group(1).strip() for match in _PROMPT_RE.finditer(raw_content)]
+                if len(analyses) == len(batch):
+                    for trend in batch:
+                        logger.info("✅ Successfully analyzed image: %s", trend['title'])
+                    return [{**trend, "analysis": analysis} for trend, analysis in zip(batch, analyses)]
 
-            logger.info(f"✅ Found {len(trends)} potential trend images.")
-            return trends
+            logger.warning("⚠️ Batch analysis returned an unexpected format, analyzing images individually.")
 
         except Exception as e:
-            logger.error(f"❌ Trend research failed: {str(e)}")
-            return []
+            logger.warning("⚠️ Batch analysis failed, analyzing images individually: %s", e)
 
-    def analyze_trend_images(self, trends: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Analyze images using a multimodal AI to extract design insights"""
-        logger.info(f"🖼️ Analyzing {len(trends)} trend images with multimodal AI...")
-        analyzed_trends = []
+        return [self._analyze_trend_image(trend) for trend in batch]
 
-        for trend in trends:
-            try:
-                response = self.client.chat.completions.create(
-                    model="google/gemini-flash-1.5",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": "Analyze this t-shirt design image. Describe the main subject, style (e.g., minimalist, vintage, abstract), color palette, and overall mood. Provide a concise, one-sentence summary of the design concept."
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": trend["image_url"]
-                                    }
+    def _analyze_trend_image(self, trend: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Analyze a single trend image. Returns the trend with its analysis, or None on failure."""
+        try:
+            response = self._create_completion(
+                model="google/gemini-flash-1.5",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": "Analyze this t-shirt design image. Describe the main subject, style (e.g., minimalist, vintage, abstract), color palette, and overall mood. Provide a concise, one-sentence summary of the design concept."
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": trend["image_url"]
                                 }
-                            ]
-                        }
-                    ],
-                    max_tokens=200
-                )
+                            }
+                        ]
+                    }
+                ],
+                max_tokens=200
+            )
 
-                if response.choices:
-                    analysis = response.choices[0].message.content
-                    analyzed_trends.append({**trend, "analysis": analysis})
-                    logger.info(f"✅ Successfully analyzed image: {trend['title']}")
+            if response.choices:
+                analysis = (response.choices[0].message.content or "").strip()
+                if analysis:
+                    logger.info("✅ Successfully analyzed image: %s", trend['title'])
+                    return {**trend, "analysis": analysis}
+                logger.warning("⚠️ Empty analysis for image %s, skipping it.", trend['title'])
 
-            except Exception as e:
-                logger.warning(f"⚠️ Failed to analyze image {trend['title']}: {str(e)}")
+        except Exception as e:
+            logger.warning("⚠️ Failed to analyze image %s: %s", trend['title'], e)
 
-        logger.info(f"✅ Analysis complete. {len(analyzed_trends)} images successfully analyzed.")
-        return analyzed_trends
+        return None
 
     def generate_image_prompts(self, trends: List[Dict[str, Any]]) -> List[str]:
         """Generate ready-to-use image generation prompts from analyzed trend data"""
@@ -130,87 +589,106 @@ class PromptGeneratorAgent:
             return self._generate_fallback_prompts()
 
         try:
+            # Analyses are meant to be one sentence; cap them to keep the prompt's input tokens bounded
             research_summary = "\n".join(
-                [f"- Image from '{trend['source']}': {trend['analysis']}" for trend in trends]
+                f"- Image from '{trend['source']}': {textwrap.shorten(trend['analysis'], width=200, placeholder='...')}"
+                for trend in trends
             )
 
-            prompt = f"""
-You are a professional prompt engineer for AI image generators, specializing in commercially viable t-shirt designs. Analyze the following trend analysis from recent t-shirt images and generate 5 production-quality prompts.
-
-**Trend Analysis:**
-{research_summary}
+            # Key on the set of trends rather than the LLM-written analyses, which vary
+            # from run to run even when the underlying images are the same.
+            cache_key = QueryCache.make_key(*sorted(f"{trend['title']}|{trend['image_url']}" for trend in trends))
+            cached_prompts = self.prompt_cache.get(cache_key)
+            if cached_prompts is not None:
+                logger.info("♻️ Reusing prompts generated for the same trend analysis.")
+                return list(cached_prompts)
 
-**Instructions:**
-1.  Create 5 unique, detailed prompts inspired by the analysis.
-2.  Each prompt must be ready for a text-to-image API like DALL-E 3.
-3.  Include critical details for t-shirt printing: style (e.g., minimalist vector, vintage screen-print), color palette, composition, and background (isolated on white is standard).
-4.  Optimize for commercial use: clean lines, scalable details, and clear subject matter.
-5.  Format: A numbered list of 5 prompts. No extra explanations.
-
-**Example of a perfect prompt:**
-*Minimalist single-line art of a cat, sleek and modern, black ink on a white background, vector style, high detail, commercial use ready.*
-
-Now, generate 5 unique prompts based on the trend analysis:
-"""
-
-            completion = self.client.chat.completions.create(
+            # Stream the completion so we can stop as soon as 5 prompts have arrived
+            stream = self._create_completion(
                 model="minimax/minimax-m2:free",
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": PROMPT_ENGINEER_RULES},
+                    {"role": "user", "content": f"Trend analysis:\n{research_summary}\n\nWrite 5 prompts."}
+                ],
                 temperature=0.9,
-                max_tokens=1000
+                max_tokens=1000,
+                stream=True
             )
 
-            if completion and completion.choices:
-                raw_content = completion.choices[0].message.content.strip()
-                prompts = self._extract_clean_prompts(raw_content)
-                if len(prompts) >= 3:
-                    logger.info("✅ Successfully generated prompts from trend analysis.")
-                    return prompts[:5]
+            prompts = self._collect_streamed_prompts(stream, limit=5)
+            if len(prompts) >= 3:
+                logger.info("✅ Successfully generated prompts from trend analysis.")
+                self.prompt_cache.set(cache_key, prompts)
+                return list(prompts)
 
             logger.warning("⚠️ AI prompt generation failed, using fallback prompts.")
             return self._generate_fallback_prompts()
 
         except Exception as e:
-            logger.error(f"❌ Prompt generation failed: {str(e)}")
+            logger.error("❌ Prompt generation failed: %s", e)
             return self._generate_fallback_prompts()
 
-    def _extract_clean_prompts(self, raw_content: str) -> List[str]:
-        """Extracts clean, numbered prompts from a raw text block."""
+    def _collect_streamed_prompts(self, stream, limit: int = 5) -> List[str]:
+        """Extracts numbered prompts from a streamed completion, closing the stream once `limit` prompts are found."""
         prompts = []
-        lines = raw_content.split('\n')
-        prompt_pattern = r'^\s*\d+[.)]\s*(.+)$'
+        buffer = ""
 
-        for line in lines:
-            match = re.match(prompt_pattern, line)
-            if match:
-                prompt = match.group(1).strip()
-                if len(prompt) > 30: # Basic validation
-                    prompts.append(prompt)
-        return prompts
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                buffer += chunk.choices[0].delta.content or ""
+                *lines, buffer = buffer.split('\n')
+
+                for line in lines:
+                    prompt = self._parse_prompt_line(line)
+                    if prompt:
+                        prompts.append(prompt)
+                        if len(prompts) >= limit:
+                            return prompts
+
+            # The final line may not be newline-terminated
+            prompt = self._parse_prompt_line(buffer)
+            if prompt:
+                prompts.append(prompt)
+            return prompts[:limit]
+
+        finally:
+            stream.close()
+
+    def _parse_prompt_line(self, line: str) -> Optional[str]:
+        """Returns the prompt text of a numbered line, or None if the line is not a usable prompt."""
+        match = _PROMPT_RE.match(line)
+        if match:
+            prompt = match.group(1).strip()
+            if len(prompt) > 30: # Basic validation
+                return prompt
+        return None
 
     def _generate_fallback_prompts(self) -> List[str]:
         """Provides a set of high-quality fallback prompts."""
         logger.info("🔄 Generating fallback prompts.")
-        return [
-            "Minimalist geometric wolf head, clean vector lines, black and gold color scheme, isolated on a white background, commercial printing ready.",
-            "Vintage-style sunset over a mountain range, distressed texture, retro color palette (orange, yellow, brown), detailed illustration, for screen printing.",
-            "Abstract cyberpunk brain with glowing neon circuits, futuristic and detailed, on a black t-shirt background, vibrant colors (pink, blue, purple).",
-            "Hand-drawn botanical illustration of a monstera leaf, detailed line work, sage green and white, minimalist and elegant, vector art.",
-            "Bold typography design with the word 'CREATE', letters breaking apart into geometric shapes, inspirational and modern, black and white with a single accent color."
-        ]
+        return list(_FALLBACK_PROMPTS)
 
-    def send_telegram_report(self, prompts: List[str], trends: List[Dict[str, Any]]):
-        """Send a comprehensive report with prompts and trend insights via Telegram."""
+    def send_telegram_report(self, prompts: List[str], trends: List[Dict[str, Any]], report_time: Optional[datetime] = None):
+        """Send a comprehensive report with prompts and trend insights via Telegram, stamped with `report_time` (default: now)."""
         logger.info("📲 Sending enhanced Telegram report...")
 
         try:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M')
+            current_time = (report_time or datetime.now()).strftime('%Y-%m-%d %H:%M')
 
             # Create a summary of the analyzed trends
+            # Search titles and AI output are escaped so a stray '<' or '&' cannot break
+            # Telegram's HTML parsing and get the whole message rejected
             trend_summary = "\n".join(
-                [f"• <b>{trend['title']}</b> (from {trend['source']}): <i>{trend.get('analysis', 'Analysis pending...')}</i>" for trend in trends[:3]]
+                f"• <b>{html.escape(trend['title'])}</b> (from {html.escape(trend['source'])}): "
+                f"<i>{html.escape(trend.get('analysis') or 'Analysis pending...')}</i>"
+                for trend in trends[:3]
             )
 
+            # Join the prompt lines once instead of growing the report string in a loop
+            prompt_block = "".join(f"{i}. <code>{html.escape(prompt)}</code>\n\n" for i, prompt in enumerate(prompts, 1))
+
             report = f"""
 🤖 <b>AI T-SHIRT DESIGN AGENT REPORT</b>
 ⏱️ {current_time}
@@ -221,12 +699,7 @@ Now, generate 5 unique prompts based on the trend analysis:
 🎨 <b>READY-TO-USE IMAGE PROMPTS</b>
 <i>Based on the latest visual trends. Copy and paste into the generator:</i>
 
-"""
-
-            for i, prompt in enumerate(prompts, 1):
-                report += f"{i}. <code>{prompt}</code>\n\n"
-
-            report += f"""
+{prompt_block}
 ✅ <b>NEXT STEPS</b>
 1.  Copy a prompt and paste it into the web UI.
 2.  Generate designs and save your favorites.
@@ -235,7 +708,6 @@ Now, generate 5 unique prompts based on the trend analysis:
 🔄 <b>Next research cycle will begin in 6 hours.</b>
 """
 
-            url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
             payload = {
                 'chat_id': self.chat_id,
                 'text': report,
@@ -243,45 +715,62 @@ Now, generate 5 unique prompts based on the trend analysis:
                 'disable_web_page_preview': True
             }
 
-            response = requests.post(url, json=payload, timeout=30)
+            response = self.session.post(
+                self._telegram_url,
+                data=orjson.dumps(payload),
+                headers={'Content-Type': 'application/json'},
+                timeout=30
+            )
             response.raise_for_status()
             logger.info("✅ Telegram report sent successfully.")
 
         except Exception as e:
-            logger.error(f"❌ Failed to send Telegram report: {str(e)}")
+            logger.error("❌ Failed to send Telegram report: %s", e)
 
     def run_autonomous_cycle(self):
         """Run the complete, enhanced autonomous cycle."""
         logger.info("🚀 Starting enhanced autonomous cycle...")
-        start_time = time.time()
+        start_time = time.perf_counter()
+        cycle_start = datetime.now()
 
         try:
-            # Phase 1: Professional trend research
-            trends = self.conduct_trend_research()
-
-            # Phase 2: AI-powered image analysis
-            analyzed_trends = self.analyze_trend_images(trends)
+            # Phases 1 & 2: Trend research pipelined with AI-powered image analysis
+            analyzed_trends = self.research_and_analyze_trends()
 
             # Phase 3: Generate prompts from visual insights
             prompts = self.generate_image_prompts(analyzed_trends)
 
-            # Phase 4: Send comprehensive report
-            self.send_telegram_report(prompts, analyzed_trends)
-
-            duration = time.time() - start_time
-            logger.info(f"✅ Enhanced cycle completed in {duration:.2f} seconds.")
+            # Phase 4: Send comprehensive report. It is the last step of the cycle, so it is
+            # sent inline; each attempt is bounded by the session's request timeout.
+            self.send_telegram_report(prompts, analyzed_trends, cycle_start)
+
+            duration = time.perf_counter() - start_time
+            logger.info("✅ Enhanced cycle completed in %.2f seconds.", duration)
+            logger.info(
+                "♻️ Cache hits: searches %d/%d, analyses %d/%d, prompts %d/%d",
+                self.search_cache.hits, self.search_cache.hits + self.search_cache.misses,
+                self.analysis_cache.hits, self.analysis_cache.hits + self.analysis_cache.misses,
+                self.prompt_cache.hits, self.prompt_cache.hits + self.prompt_cache.misses
+            )
 
         except Exception as e:
-            logger.exception(f"❌ A critical error occurred in the autonomous cycle: {str(e)}")
+            logger.exception("❌ A critical error occurred in the autonomous cycle: %s", e)
 
 def main():
+    parser = argparse.ArgumentParser(description='Run one autonomous trend research and prompt generation cycle')
+    parser.add_argument('--clear-cache', action='store_true', help='Discard cached searches, analyses and prompts before the cycle')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
     try:
         logger.info("🎯 Initializing Enhanced T-Shirt Design Agent")
-        agent = PromptGeneratorAgent()
-        agent.run_autonomous_cycle()
+        with PromptGeneratorAgent() as agent:
+            if args.clear_cache:
+                agent.clear_caches()
+            agent.run_autonomous_cycle()
 
     except Exception as e:
-        logger.exception(f"💥 Critical startup error: {str(e)}")
+        logger.exception("💥 Critical startup error: %s", e)
 
 if __name__ == "__main__":
     main()
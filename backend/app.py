@@ -1,27 +1,34 @@
 from flask import Flask, render_template, jsonify
+import logging
 import os
 import sys
+import threading
 
 # Add the backend directory to the Python path to allow for relative imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from agent_core import PromptGeneratorAgent
+from agent_core import LOG_FORMAT, PromptGeneratorAgent
 
 app = Flask(__name__,
             template_folder=os.path.abspath('../frontend'),
             static_folder=os.path.abspath('../frontend/static'))
 
-# Memoize the agent instance to avoid re-initializing on every request
+# Memoize the agent instance to avoid re-initializing on every request. The agent
+# owns the HTTP connection pools, so every request reuses the same warm connections.
 agent_instance = None
+agent_lock = threading.Lock()
 
 def get_agent():
     global agent_instance
     if agent_instance is None:
-        try:
-            agent_instance = PromptGeneratorAgent()
-        except ValueError as e:
-            # This will be caught and sent to the frontend
-            raise e
+        # Concurrent first requests must not each build (and leak) their own agent
+        with agent_lock:
+            if agent_instance is None:
+                try:
+                    agent_instance = PromptGeneratorAgent()
+                except ValueError as e:
+                    # This will be caught and sent to the frontend
+                    raise e
     return agent_instance
 
 @app.route('/')
@@ -33,14 +40,11 @@ def run_trend_analysis():
     try:
         agent = get_agent()
 
-        # Run the core logic of the agent
-        trends = agent.conduct_trend_research()
-        if not trends:
-            return jsonify({"error": "Could not find any trends. The search may have failed."}), 500
-
-        analyzed_trends = agent.analyze_trend_images(trends)
+        # Run the core logic of the agent. Research and image analysis are pipelined,
+        # so images are analyzed while the remaining searches are still running.
+        analyzed_trends = agent.research_and_analyze_trends()
         if not analyzed_trends:
-            return jsonify({"error": "Failed to analyze trend images with the AI model."}), 500
+            return jsonify({"error": "Could not find or analyze any trends. The search or the AI analysis may have failed."}), 500
 
         prompts = agent.generate_image_prompts(analyzed_trends)
         if not prompts:
@@ -68,4 +72,5 @@ def run_trend_analysis():
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
     app.run(debug=True, port=8080)
@@ -18,18 +18,22 @@ Usage:
 """
 
 import os
-import sys
 import json
+import html
 import argparse
-import textwrap
 from datetime import datetime
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+import orjson
 from openrouter import OpenRouter
 
 # Configuration - Set these in your GitHub secrets or environment variables
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY', '')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID', '')
+TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
 
 # Design styles database for better suggestions
 DESIGN_STYLES = {
@@ -60,10 +64,243 @@ DESIGN_STYLES = {
     }
 }
 
+# Prompt for extracting structured requirements from a client request
+_ANALYSIS_PROMPT_TMPL = """
+Analyze this Fiverr client request for a t-shirt design and extract key information:
+
+Client request: "{client_request}"
+
+Extract and format the response as JSON with these keys:
+- "client_name": (extract if mentioned, otherwise "Client")
+- "brand_name": (extract brand/business name if mentioned)
+- "design_subject": (main subject/theme requested)
+- "colors": (specific colors mentioned)
+- "style_preferences": (style keywords mentioned)
+- "special_requirements": (any special requirements like "for gym", "for coffee shop", etc.)
+- "sentiment": ("excited", "urgent", "professional", "casual")
+
+Keep it concise and accurate. Only include information explicitly mentioned or strongly implied.
+"""
+
+# Prompt for turning the request analysis into 3 design concepts
+_CONCEPTS_PROMPT_TMPL = """
+You are a professional t-shirt designer responding to a Fiverr client. Create 3 unique design concepts based on this client analysis:
+
+Client Analysis:
+- Brand: {brand_name}
+- Design Subject: {design_subject}
+- Colors: {colors}
+- Style Preferences: {style_preferences}
+- Special Requirements: {special_requirements}
+- Sentiment: {sentiment}
+
+For each concept, provide:
+1. A catchy concept name
+2. Detailed description (2-3 sentences)
+3. Suggested color palette (2-3 colors max)
+4. Style keywords (2-3 relevant style keywords)
+
+Format as numbered list:
+1. [Concept Name]
+   Description: [description]
+   Colors: [color1, color2, color3]
+   Style: [style keywords]
+
+2. [Concept Name]
+   Description: [description]  
+   Colors: [color1, color2]
+   Style: [style keywords]
+
+3. [Concept Name]
+   Description: [description]
+   Colors: [color1, color2, color3]
+   Style: [style keywords]
+
+Keep descriptions professional but engaging. Focus on commercial viability and print readiness.
+"""
+
+# Prompt for the ready-to-send Fiverr reply
+_RESPONSE_PROMPT_TMPL = """
+You are a professional Fiverr freelancer responding to a t-shirt design client. Create a warm, professional response that:
+
+1. Acknowledges their request positively
+2. Shows you understood their needs
+3. Presents 3 design concepts clearly
+4. Asks specific follow-up questions to narrow down preferences
+5. Sets clear next steps and timeline expectations
+6. Includes appropriate closing
+
+Client Analysis:
+- Client Name: {client_name}
+- Brand: {brand_name}
+- Key Requirements: {design_subject}, {colors} colors
+
+Design Concepts:
+{design_concepts}
+
+Response Guidelines:
+- Keep it conversational but professional
+- Use emojis sparingly (1-2 maximum) for warmth
+- Include specific questions about their preferences
+- Mention 24-48 hour delivery timeline
+- Offer 2 rounds of revisions included
+- End with clear call to action
+
+Format as plain text ready to copy-paste into Fiverr messages.
+"""
+
+# Prompt for converting design concepts into Puter.js image prompts (literal JSON braces are doubled)
+_PUTER_PROMPT_TMPL = """
+Convert these 3 design concepts into perfect Puter.js prompts for image generation. Each prompt should:
+
+1. Be highly detailed and specific
+2. Include style guidance (minimalist, vintage, etc.)
+3. Specify color palette clearly
+4. Mention "t-shirt design" and "white background" 
+5. Be optimized for commercial use and printing
+6. Include technical terms like "vector style", "clean lines", "isolated on white"
+
+Design Concepts:
+{design_concepts}
+
+Format as JSON array with these keys for each concept:
+[
+  {{
+    "concept_name": "Concept 1 name",
+    "puter_prompt": "Detailed prompt for Puter.js",
+    "recommended_model": "dall-e-3 or gpt-image-1",
+    "quality_setting": "hd or high"
+  }},
+  {{
+    "concept_name": "Concept 2 name", 
+    "puter_prompt": "Detailed prompt for Puter.js",
+    "recommended_model": "dall-e-3 or gpt-image-1",
+    "quality_setting": "hd or high"
+  }},
+  {{
+    "concept_name": "Concept 3 name",
+    "puter_prompt": "Detailed prompt for Puter.js", 
+    "recommended_model": "dall-e-3 or gpt-image-1",
+    "quality_setting": "hd or high"
+  }}
+]
+
+Make prompts commercial-ready and printing-friendly.
+"""
+
+# Offline fallbacks, used when OpenRouter is not configured or a request fails.
+# Shared across calls, so callers get copies and the constants stay untouched.
+_OFFLINE_ANALYSIS = MappingProxyType({
+    "client_name": "Client",
+    "brand_name": "Brand",
+    "design_subject": "custom t-shirt design",
+    "colors": ("not specified",),
+    "style_preferences": ("professional",),
+    "special_requirements": ("commercial use",),
+    "sentiment": "professional"
+})
+
+# Used when the AI analysis fails; design_subject is filled in from the request
+_FAILED_ANALYSIS = MappingProxyType({
+    "client_name": "Client",
+    "brand_name": "Brand",
+    "colors": ("flexible",),
+    "style_preferences": ("professional",),
+    "special_requirements": ("ready for printing",),
+    "sentiment": "professional"
+})
+
+_FALLBACK_DESIGN_CONCEPTS = """
+1. Minimalist Brand Focus
+   Description: Clean, professional design focusing on the brand name with subtle supporting elements. Perfect for business use and easy recognition.
+   Colors: black, white
+   Style: minimalist, professional
+
+2. Creative Typography
+   Description: Bold typography treatment of the brand name with creative letter arrangements and modern font choices. Great for making a statement.
+   Colors: navy blue, gold
+   Style: typography, modern
+
+3. Symbolic Abstract
+   Description: Abstract representation of the brand concept using geometric shapes and patterns. Artistic yet professional for versatile use.
+   Colors: charcoal gray, accent color
+   Style: geometric, abstract
+"""
+
+_FALLBACK_RESPONSE_TMPL = """
+Hi {client_name}! 👋
+
+Thank you so much for your order! I love the concept for your {brand_name} t-shirt design - it sounds like a fantastic project.
+
+Based on your request, I've created 3 unique design concepts for you:
+
+1. **Minimalist Brand Focus**
+   Clean, professional design focusing on your brand name with subtle supporting elements. Perfect for business use and easy recognition.
+   Colors: Black and white
+   Style: Minimalist, professional
+
+2. **Creative Typography**
+   Bold typography treatment of your brand name with creative letter arrangements and modern font choices. Great for making a statement.
+   Colors: Navy blue and gold
+   Style: Typography, modern
+
+3. **Symbolic Abstract**
+   Abstract representation of your brand concept using geometric shapes and patterns. Artistic yet professional for versatile use.
+   Colors: Charcoal gray with accent color
+   Style: Geometric, abstract
+
+To help me create the perfect design for you, could you let me know:
+✅ Which concept resonates most with your vision?
+✅ Do you have specific brand colors I should prioritize?
+✅ Will this be for personal use, business merchandise, or retail sales?
+
+I'll deliver your first design concepts within 24 hours of your feedback. I include 2 rounds of revisions to ensure you're 100% satisfied.
+
+Looking forward to bringing your vision to life!
+
+Best regards,
+[Your Name]
+"""
+
+_FALLBACK_PUTER_PROMPTS = (
+    MappingProxyType({
+        "concept_name": "Minimalist Brand Focus",
+        "puter_prompt": "Minimalist t-shirt design featuring clean typography of brand name with subtle geometric accents, professional business style, black and white color scheme, vector art style, isolated on white background, commercial use ready",
+        "recommended_model": "dall-e-3",
+        "quality_setting": "hd"
+    }),
+    MappingProxyType({
+        "concept_name": "Creative Typography",
+        "puter_prompt": "Bold modern typography t-shirt design with creative letter arrangement for brand name, navy blue and gold color scheme, clean vector style, isolated on white background, commercial printing ready",
+        "recommended_model": "gpt-image-1",
+        "quality_setting": "high"
+    }),
+    MappingProxyType({
+        "concept_name": "Symbolic Abstract",
+        "puter_prompt": "Abstract geometric t-shirt design representing brand concept with artistic patterns, charcoal gray and accent color scheme, minimalist vector art style, isolated on white background, commercial use ready",
+        "recommended_model": "dall-e-3", 
+        "quality_setting": "hd"
+    })
+)
+
 class ClientOrderAssistant:
     def __init__(self):
         self.openrouter = OpenRouter(api_key=OPENROUTER_API_KEY) if OPENROUTER_API_KEY else None
         self.session_history = []
+
+        # Reuse one keep-alive connection to the Telegram API across notifications
+        self.http = requests.Session()
+        self.http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release pooled network connections"""
+        self.http.close()
         
     def send_telegram(self, message):
         """Send notification to your Telegram (optional)"""
@@ -71,109 +308,53 @@ class ClientOrderAssistant:
             return
             
         try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
             payload = {
                 'chat_id': TELEGRAM_CHAT_ID,
                 'text': message,
                 'parse_mode': 'HTML'
             }
-            requests.post(url, json=payload)
+            self.http.post(TELEGRAM_API_URL, data=orjson.dumps(payload), headers={'Content-Type': 'application/json'}, timeout=30)
         except Exception as e:
             print(f"Telegram notification failed: {e}")
     
     def analyze_client_request(self, client_request):
         """Analyze the client request to extract key requirements"""
-        prompt = f"""
-        Analyze this Fiverr client request for a t-shirt design and extract key information:
-
-        Client request: "{client_request}"
+        if self.openrouter is None:
+            # Fallback analysis without AI
+            return dict(_OFFLINE_ANALYSIS)
 
-        Extract and format the response as JSON with these keys:
-        - "client_name": (extract if mentioned, otherwise "Client")
-        - "brand_name": (extract brand/business name if mentioned)
-        - "design_subject": (main subject/theme requested)
-        - "colors": (specific colors mentioned)
-        - "style_preferences": (style keywords mentioned)
-        - "special_requirements": (any special requirements like "for gym", "for coffee shop", etc.)
-        - "sentiment": ("excited", "urgent", "professional", "casual")
-
-        Keep it concise and accurate. Only include information explicitly mentioned or strongly implied.
-        """
+        prompt = _ANALYSIS_PROMPT_TMPL.format(client_request=client_request)
         
         try:
-            if self.openrouter:
-                completion = self.openrouter.completion(
-                    model="minimax/minimax-m2:free",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3,
-                    max_tokens=300
-                )
-                response = completion.choices[0].message.content
-                
-                # Clean and parse JSON response
-                response = response.strip('```json').strip('```').strip()
-                return json.loads(response)
-            else:
-                # Fallback analysis without AI
-                return {
-                    "client_name": "Client",
-                    "brand_name": "Brand",
-                    "design_subject": "custom t-shirt design",
-                    "colors": ["not specified"],
-                    "style_preferences": ["professional"],
-                    "special_requirements": ["commercial use"],
-                    "sentiment": "professional"
-                }
+            completion = self.openrouter.completion(
+                model="minimax/minimax-m2:free",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=300
+            )
+            response = completion.choices[0].message.content
+            
+            # Clean and parse JSON response
+            response = response.strip('```json').strip('```').strip()
+            return json.loads(response)
                 
         except Exception as e:
             print(f"Analysis failed: {e}")
-            return {
-                "client_name": "Client", 
-                "brand_name": "Brand",
-                "design_subject": client_request[:50] + "...",
-                "colors": ["flexible"],
-                "style_preferences": ["professional"],
-                "special_requirements": ["ready for printing"],
-                "sentiment": "professional"
-            }
+            return {**_FAILED_ANALYSIS, "design_subject": client_request[:50] + "..."}
     
     def generate_design_concepts(self, analysis):
         """Generate 3 professional design concepts based on client analysis"""
-        prompt = f"""
-        You are a professional t-shirt designer responding to a Fiverr client. Create 3 unique design concepts based on this client analysis:
-
-        Client Analysis:
-        - Brand: {analysis['brand_name']}
-        - Design Subject: {analysis['design_subject']}
-        - Colors: {', '.join(analysis['colors'])}
-        - Style Preferences: {', '.join(analysis['style_preferences'])}
-        - Special Requirements: {analysis['special_requirements']}
-        - Sentiment: {analysis['sentiment']}
-
-        For each concept, provide:
-        1. A catchy concept name
-        2. Detailed description (2-3 sentences)
-        3. Suggested color palette (2-3 colors max)
-        4. Style keywords (2-3 relevant style keywords)
-
-        Format as numbered list:
-        1. [Concept Name]
-           Description: [description]
-           Colors: [color1, color2, color3]
-           Style: [style keywords]
-
-        2. [Concept Name]
-           Description: [description]  
-           Colors: [color1, color2]
-           Style: [style keywords]
-
-        3. [Concept Name]
-           Description: [description]
-           Colors: [color1, color2, color3]
-           Style: [style keywords]
-
-        Keep descriptions professional but engaging. Focus on commercial viability and print readiness.
-        """
+        if self.openrouter is None:
+            return _FALLBACK_DESIGN_CONCEPTS
+
+        prompt = _CONCEPTS_PROMPT_TMPL.format(
+            brand_name=analysis['brand_name'],
+            design_subject=analysis['design_subject'],
+            colors=', '.join(analysis['colors']),
+            style_preferences=', '.join(analysis['style_preferences']),
+            special_requirements=', '.join(analysis['special_requirements']),
+            sentiment=analysis['sentiment']
+        )
         
         try:
             completion = self.openrouter.completion(
@@ -185,53 +366,20 @@ class ClientOrderAssistant:
             return completion.choices[0].message.content
         except Exception as e:
             print(f"Concept generation failed: {e}")
-            return """
-            1. Minimalist Brand Focus
-               Description: Clean, professional design focusing on the brand name with subtle supporting elements. Perfect for business use and easy recognition.
-               Colors: black, white
-               Style: minimalist, professional
-
-            2. Creative Typography
-               Description: Bold typography treatment of the brand name with creative letter arrangements and modern font choices. Great for making a statement.
-               Colors: navy blue, gold
-               Style: typography, modern
-
-            3. Symbolic Abstract
-               Description: Abstract representation of the brand concept using geometric shapes and patterns. Artistic yet professional for versatile use.
-               Colors: charcoal gray, accent color
-               Style: geometric, abstract
-            """
+            return _FALLBACK_DESIGN_CONCEPTS
     
     def generate_professional_response(self, analysis, design_concepts):
         """Generate a professional response message the user can send to client"""
-        prompt = f"""
-        You are a professional Fiverr freelancer responding to a t-shirt design client. Create a warm, professional response that:
-
-        1. Acknowledges their request positively
-        2. Shows you understood their needs
-        3. Presents 3 design concepts clearly
-        4. Asks specific follow-up questions to narrow down preferences
-        5. Sets clear next steps and timeline expectations
-        6. Includes appropriate closing
-
-        Client Analysis:
-        - Client Name: {analysis['client_name']}
-        - Brand: {analysis['brand_name']}
-        - Key Requirements: {analysis['design_subject']}, {', '.join(analysis['colors'])} colors
-
-        Design Concepts:
-        {design_concepts}
-
-        Response Guidelines:
-        - Keep it conversational but professional
-        - Use emojis sparingly (1-2 maximum) for warmth
-        - Include specific questions about their preferences
-        - Mention 24-48 hour delivery timeline
-        - Offer 2 rounds of revisions included
-        - End with clear call to action
-
-        Format as plain text ready to copy-paste into Fiverr messages.
-        """
+        if self.openrouter is None:
+            return _FALLBACK_RESPONSE_TMPL.format(client_name=analysis['client_name'], brand_name=analysis['brand_name'])
+
+        prompt = _RESPONSE_PROMPT_TMPL.format(
+            client_name=analysis['client_name'],
+            brand_name=analysis['brand_name'],
+            design_subject=analysis['design_subject'],
+            colors=', '.join(analysis['colors']),
+            design_concepts=design_concepts
+        )
         
         try:
             completion = self.openrouter.completion(
@@ -243,80 +391,14 @@ class ClientOrderAssistant:
             return completion.choices[0].message.content
         except Exception as e:
             print(f"Response generation failed: {e}")
-            return f"""
-            Hi {analysis['client_name']}! 👋
-
-            Thank you so much for your order! I love the concept for your {analysis['brand_name']} t-shirt design - it sounds like a fantastic project.
-
-            Based on your request, I've created 3 unique design concepts for you:
-
-            1. **Minimalist Brand Focus**
-               Clean, professional design focusing on your brand name with subtle supporting elements. Perfect for business use and easy recognition.
-               Colors: Black and white
-               Style: Minimalist, professional
-
-            2. **Creative Typography**
-               Bold typography treatment of your brand name with creative letter arrangements and modern font choices. Great for making a statement.
-               Colors: Navy blue and gold
-               Style: Typography, modern
-
-            3. **Symbolic Abstract**
-               Abstract representation of your brand concept using geometric shapes and patterns. Artistic yet professional for versatile use.
-               Colors: Charcoal gray with accent color
-               Style: Geometric, abstract
-
-            To help me create the perfect design for you, could you let me know:
-            ✅ Which concept resonates most with your vision?
-            ✅ Do you have specific brand colors I should prioritize?
-            ✅ Will this be for personal use, business merchandise, or retail sales?
-
-            I'll deliver your first design concepts within 24 hours of your feedback. I include 2 rounds of revisions to ensure you're 100% satisfied.
-
-            Looking forward to bringing your vision to life!
-
-            Best regards,
-            [Your Name]
-            """
+            return _FALLBACK_RESPONSE_TMPL.format(client_name=analysis['client_name'], brand_name=analysis['brand_name'])
     
     def generate_puter_js_prompts(self, design_concepts):
         """Generate Puter.js prompts for each design concept"""
-        prompt = f"""
-        Convert these 3 design concepts into perfect Puter.js prompts for image generation. Each prompt should:
+        if self.openrouter is None:
+            return [dict(prompt) for prompt in _FALLBACK_PUTER_PROMPTS]
 
-        1. Be highly detailed and specific
-        2. Include style guidance (minimalist, vintage, etc.)
-        3. Specify color palette clearly
-        4. Mention "t-shirt design" and "white background" 
-        5. Be optimized for commercial use and printing
-        6. Include technical terms like "vector style", "clean lines", "isolated on white"
-
-        Design Concepts:
-        {design_concepts}
-
-        Format as JSON array with these keys for each concept:
-        [
-          {{
-            "concept_name": "Concept 1 name",
-            "puter_prompt": "Detailed prompt for Puter.js",
-            "recommended_model": "dall-e-3 or gpt-image-1",
-            "quality_setting": "hd or high"
-          }},
-          {{
-            "concept_name": "Concept 2 name", 
-            "puter_prompt": "Detailed prompt for Puter.js",
-            "recommended_model": "dall-e-3 or gpt-image-1",
-            "quality_setting": "hd or high"
-          }},
-          {{
-            "concept_name": "Concept 3 name",
-            "puter_prompt": "Detailed prompt for Puter.js", 
-            "recommended_model": "dall-e-3 or gpt-image-1",
-            "quality_setting": "hd or high"
-          }}
-        ]
-
-        Make prompts commercial-ready and printing-friendly.
-        """
+        prompt = _PUTER_PROMPT_TMPL.format(design_concepts=design_concepts)
         
         try:
             completion = self.openrouter.completion(
@@ -330,31 +412,13 @@ class ClientOrderAssistant:
             return json.loads(response)
         except Exception as e:
             print(f"Prompt generation failed: {e}")
-            return [
-                {
-                    "concept_name": "Minimalist Brand Focus",
-                    "puter_prompt": "Minimalist t-shirt design featuring clean typography of brand name with subtle geometric accents, professional business style, black and white color scheme, vector art style, isolated on white background, commercial use ready",
-                    "recommended_model": "dall-e-3",
-                    "quality_setting": "hd"
-                },
-                {
-                    "concept_name": "Creative Typography",
-                    "puter_prompt": "Bold modern typography t-shirt design with creative letter arrangement for brand name, navy blue and gold color scheme, clean vector style, isolated on white background, commercial printing ready",
-                    "recommended_model": "gpt-image-1",
-                    "quality_setting": "high"
-                },
-                {
-                    "concept_name": "Symbolic Abstract",
-                    "puter_prompt": "Abstract geometric t-shirt design representing brand concept with artistic patterns, charcoal gray and accent color scheme, minimalist vector art style, isolated on white background, commercial use ready",
-                    "recommended_model": "dall-e-3", 
-                    "quality_setting": "hd"
-                }
-            ]
+            return [dict(prompt) for prompt in _FALLBACK_PUTER_PROMPTS]
     
     def process_client_order(self, client_request):
         """Main function to process a client order and generate all outputs"""
+        generated_at = datetime.now().strftime('%Y-%m-%d %H:%M')
         print("\n" + "="*80)
-        print(f"🤖 FIVERR CLIENT ORDER ASSISTANT - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        print(f"🤖 FIVERR CLIENT ORDER ASSISTANT - {generated_at}")
         print("="*80)
         
         print(f"\n📋 Client Request: \"{client_request}\"\n")
@@ -369,14 +433,15 @@ class ClientOrderAssistant:
         design_concepts = self.generate_design_concepts(analysis)
         print("✅ 3 design concepts generated")
         
-        # Step 3: Generate professional response
-        print("\n💬 Creating professional response...")
-        professional_response = self.generate_professional_response(analysis, design_concepts)
+        # Steps 3 & 4: The response and the Puter.js prompts both depend only on the
+        # concepts, so generate them concurrently
+        print("\n💬 Creating professional response and ⚡ Puter.js prompts for image generation...")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            response_future = pool.submit(self.generate_professional_response, analysis, design_concepts)
+            prompts_future = pool.submit(self.generate_puter_js_prompts, design_concepts)
+            professional_response = response_future.result()
+            puter_prompts = prompts_future.result()
         print("✅ Professional response created")
-        
-        # Step 4: Generate Puter.js prompts
-        print("\n⚡ Creating Puter.js prompts for image generation...")
-        puter_prompts = self.generate_puter_js_prompts(design_concepts)
         print("✅ Puter.js prompts ready")
         
         # Step 5: Create final output report
@@ -385,7 +450,7 @@ class ClientOrderAssistant:
         
         # Optional: Send Telegram notification
         if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-            self.send_telegram_notification(client_request, analysis)
+            self.send_telegram_notification(client_request, analysis, generated_at)
         
         return {
             'analysis': analysis,
@@ -407,7 +472,7 @@ class ClientOrderAssistant:
         Design Subject: {analysis['design_subject']}
         Colors: {', '.join(analysis['colors'])}
         Style Preferences: {', '.join(analysis['style_preferences'])}
-        Special Requirements: {analysis['special_requirements']}
+        Special Requirements: {', '.join(analysis['special_requirements'])}
         
         🎨 DESIGN CONCEPTS
         ==================
@@ -462,14 +527,14 @@ class ClientOrderAssistant:
         
         print(compliance_reminder)
     
-    def send_telegram_notification(self, client_request, analysis):
-        """Send summary to Telegram"""
+    def send_telegram_notification(self, client_request, analysis, generated_at):
+        """Send summary to Telegram, stamped with the time the order was processed"""
         message = f"""
         🤖 NEW CLIENT ORDER ASSISTANT
         
-        Client Request: "{client_request[:50]}..."
-        Brand: {analysis['brand_name']}
-        Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
+        Client Request: "{html.escape(client_request[:50])}..."
+        Brand: {html.escape(str(analysis['brand_name']))}
+        Generated: {generated_at}
         
         ✅ Ready-to-send response created
         ✅ 3 design concepts generated  
@@ -514,42 +579,41 @@ def main():
     args = parser.parse_args()
     
     # Initialize assistant
-    assistant = ClientOrderAssistant()
-    
-    # Check if OpenRouter API key is set
-    if not OPENROUTER_API_KEY:
-        print("\n" + "="*80)
-        print("⚠️  WARNING: OPENROUTER_API_KEY not set!")
-        print("="*80)
-        print("You need to set your OpenRouter API key to use AI features.")
-        print("Get your free API key at: https://openrouter.ai")
-        print("Set it as a GitHub secret or environment variable named 'OPENROUTER_API_KEY'")
-        print("\n💡 You can still use Puter.js for image generation without this key.")
+    with ClientOrderAssistant() as assistant:
+        # Check if OpenRouter API key is set
+        if not OPENROUTER_API_KEY:
+            print("\n" + "="*80)
+            print("⚠️  WARNING: OPENROUTER_API_KEY not set!")
+            print("="*80)
+            print("You need to set your OpenRouter API key to use AI features.")
+            print("Get your free API key at: https://openrouter.ai")
+            print("Set it as a GitHub secret or environment variable named 'OPENROUTER_API_KEY'")
+            print("\n💡 You can still use Puter.js for image generation without this key.")
         
-        # Ask if they want to continue
-        continue_anyway = input("\nDo you want to continue anyway? (y/n): ").strip().lower()
-        if continue_anyway != 'y':
-            print("👋 Exiting. Set your API key and try again!")
-            return
+            # Ask if they want to continue
+            continue_anyway = input("\nDo you want to continue anyway? (y/n): ").strip().lower()
+            if continue_anyway != 'y':
+                print("👋 Exiting. Set your API key and try again!")
+                return
     
-    # Handle different modes
-    if args.interactive:
-        assistant.interactive_mode()
-    elif args.test:
-        test_request = "I need a t-shirt design for my coffee shop called 'Morning Brew'. I want something with coffee cups and mountains, modern minimalist style."
-        print(f"\n🧪 Running test with sample request:\n\"{test_request}\"\n")
-        assistant.process_client_order(test_request)
-    elif args.request:
-        assistant.process_client_order(args.request)
-    else:
-        print("\n" + "="*80)
-        print("🤖 FIVERR CLIENT ORDER ASSISTANT")
-        print("="*80)
-        print("\nUsage examples:")
-        print("1. Single request: python client_order_assistant.py \"Client request text\"")
-        print("2. Interactive mode: python client_order_assistant.py --interactive")
-        print("3. Test mode: python client_order_assistant.py --test")
-        print("\n💡 Pro Tip: Use quotes around your client request if it contains spaces!")
+        # Handle different modes
+        if args.interactive:
+            assistant.interactive_mode()
+        elif args.test:
+            test_request = "I need a t-shirt design for my coffee shop called 'Morning Brew'. I want something with coffee cups and mountains, modern minimalist style."
+            print(f"\n🧪 Running test with sample request:\n\"{test_request}\"\n")
+            assistant.process_client_order(test_request)
+        elif args.request:
+            assistant.process_client_order(args.request)
+        else:
+            print("\n" + "="*80)
+            print("🤖 FIVERR CLIENT ORDER ASSISTANT")
+            print("="*80)
+            print("\nUsage examples:")
+            print("1. Single request: python client_order_assistant.py \"Client request text\"")
+            print("2. Interactive mode: python client_order_assistant.py --interactive")
+            print("3. Test mode: python client_order_assistant.py --test")
+            print("\n💡 Pro Tip: Use quotes around your client request if it contains spaces!")
 
 if __name__ == "__main__":
     main()